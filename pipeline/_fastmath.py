@@ -0,0 +1,81 @@
+# ===========================================
+# _fastmath.py
+# ===========================================
+
+## \file _fastmath.py
+## \brief Compiled bulk kernels backing the array path of `pipeline.safe_math`.
+##
+## \details
+## \par Description
+##     Numba-compiled versions of the safe division helpers for `np.ndarray` inputs,
+##     used for offline post-processing of whole metric columns. Invalid entries
+##     (zero or NaN denominator, NaN numerator) become NaN, the array analogue of "NA".
+##
+## \par Notes
+##     - Imported lazily by `pipeline.safe_math` only when an array is passed,
+##       so the scalar CLI path never pays the numpy/numba import or JIT cost
+##     - `cache=True` persists compiled kernels in `__pycache__` across runs
+##     - numba is optional and not in `requirements.txt`; install it (`pip install numba`)
+##       to enable the compiled kernel, otherwise an equivalent vectorized numpy fallback is used
+
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+    # All fastmath flags except nnan/ninf, which would let LLVM drop the NaN guards
+    @njit(cache=True, fastmath={"nsz", "arcp", "contract", "afn", "reassoc"}, parallel=True)
+    def _safe_div_percent(num, den, out):
+        for i in prange(num.shape[0]):
+            d = den[i]
+            n = num[i]
+            if d == 0 or np.isnan(d) or np.isnan(n):
+                out[i] = np.nan
+            else:
+                out[i] = round(n / d * 100, 4)
+
+else:
+    def _safe_div_percent(num, den, out):
+        invalid = (den == 0) | np.isnan(den) | np.isnan(num)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.round(num / den * 100, 4, out=out)
+        out[invalid] = np.nan
+
+
+def _as_float_array(values) -> np.ndarray:
+    """!Converts a column-like input to a contiguous float64 array.
+
+    Series (Polars/pandas) go through `to_numpy()`, which turns nulls into NaN.
+
+    @param values List, tuple, numpy array, or Series.
+
+    @return Contiguous float64 ndarray.
+    """
+    if hasattr(values, "to_numpy"):
+        values = values.to_numpy()
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+def safe_div_percent_array(numerator, denominator) -> np.ndarray:
+    """!Element-wise percentage division over arrays, with NaN for invalid entries.
+
+    @param numerator Numerators (list, tuple, numpy array, or Series).
+    @param denominator Denominators, same length as numerator.
+
+    @return Float64 array of percentages rounded to 4 decimals (NaN where invalid).
+
+    @throws ValueError If the inputs differ in length.
+    """
+    num = _as_float_array(numerator)
+    den = _as_float_array(denominator)
+
+    if num.shape != den.shape:
+        raise ValueError(f"Shape mismatch: {num.shape} vs {den.shape}")
+
+    out = np.empty_like(num)
+    _safe_div_percent(num.ravel(), den.ravel(), out.ravel())
+    return out
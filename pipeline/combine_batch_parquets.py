@@ -3,17 +3,20 @@
 # ===========================================
 
 ## \file combine_batch_parquets.py
-## \brief Combines multiple per-method parquet log files into a single file.
+## \brief Finalizes a batch: turns its accumulated per-method rows into a single parquet file.
 ## 
 ## \details 
 ## \par Description:
-##     Scans a given batch directory for all `perf_results_*.parquet` files,
-##     excluding the output file itself. Merges them using vertical concat,
-##     sorts by "Timestamp", and saves the result as a single compressed parquet.
+##     Reads the batch's `rows.jsonl` side-file (one line per method, written by
+##     `gen_perf_parquet_logs.py`), builds one typed Arrow table from it, sorts by
+##     "Timestamp", and writes the result as a single compressed parquet. The
+##     side-file is deleted once the outputs are written.
 ##     
 ##     After merging, the result is also appended to a global historical
-##     file specified by `DB_PATH`, which is configured via `.env` and loaded
-##     in `scripts/config.py`.
+##     dataset specified by `DB_PATH`, which is configured via `.env` and loaded
+##     in `scripts/config.py`. The dataset is Hive-partitioned by BatchID
+##     (`<DB_PATH>/BatchID=<id>/part-0.parquet`), so each append only writes
+##     the new partition.
 ## 
 ## \par Compression:
 ##     - All output parquet files are compressed using Zstandard (zstd).
@@ -22,51 +25,92 @@
 ##     $ python3 combine_batch_parquets.py <batch_dir> <output_file>
 ## 
 ## \par Arguments:
-##     <batch_dir>     Folder containing individual `.parquet` logs
+##     <batch_dir>     Folder containing the batch's `rows.jsonl`
 ##     <output_file>   Path to final combined `.parquet` file
 ## 
 ## \par Output:
 ##     - A merged parquet file containing all batch results
-##     - Updated global Parquet DB with new rows appended
+##     - A new BatchID partition in the global Parquet DB
 ## 
 ## \par Notes:
 ##     - Global Parquet path is loaded from `.env` via `scripts/config.py`
-##     - This script uses `polars` for fast DataFrame operations and I/O
+##     - This script uses `polars` expressions for derived % columns and `pyarrow` for
+##       the batch file and partitioned appends
+##     - Each batch is encoded exactly once: no per-method files are written and read back
+##     - Existing DB partitions are never opened: appending neither reads nor recompresses history,
+##       so no `ParquetWriter` row-group copy or temp-file swap is needed
 ##     - Intended to be run after `run_perf.sh` completes all method benchmarks
 
 
+from pipeline.gen_perf_parquet_logs import ROWS_FILENAME, rows_to_table
+from pipeline.schema import SCHEMA_ARROW
+from pipeline.utils import safe_div_percent_expr, write_db_partitions
 from scripts.config import DB_PATH
 from pathlib import Path
+import pyarrow.parquet as pq
 import polars as pl
+import json
 import sys
 
-if len(sys.argv) != 3:
-    print("Usage: combine_batch_parquets.py <batch_dir> <output_file>")
-    sys.exit(1)
 
-batch_dir = Path(sys.argv[1])
-output_path = Path(sys.argv[2])
-global_db_path = Path(DB_PATH)
+"""!Derived miss-% columns and their (misses, loads) inputs, computed once per batch."""
+MISS_PERCENT_FIELDS = {
+    "Cache Miss %": ("Cache Misses", "Cache Loads"),
+    "L1 Miss %": ("L1 Misses", "L1 Loads"),
+    "L2 Miss %": ("L2 Misses", "L2 Loads"),
+    "L3 Miss %": ("L3 Misses", "L3 Loads"),
+    "TLB Miss %": ("TLB Misses", "TLB Loads"),
+    "Branch Miss %": ("Branch Misses", "Branch Instructions"),
+}
 
-# --- 1. Combine batch parquet files ---
-files = [f for f in batch_dir.glob("perf_results_*.parquet") if f.name != output_path.name]
-if not files:
-    print(f"[ERROR] No .parquet files found in {batch_dir}")
-    sys.exit(0)
 
-merged = pl.concat([pl.read_parquet(f) for f in files], how="vertical_relaxed").sort("Timestamp")
-merged.write_parquet(output_path, compression="zstd")
-print(f"[INFO] Merged batch saved: {output_path}")
+def combine_batch(batch_dir, output_path, global_db_path=DB_PATH) -> None:
+    """!Writes a batch's accumulated rows to one parquet file and appends them to the global DB.
 
+    @param batch_dir Folder containing the batch's `rows.jsonl`.
+    @param output_path Path to the final combined `.parquet` file.
+    @param global_db_path Root directory of the partitioned Parquet DB.
+    """
+    rows_path = Path(batch_dir) / ROWS_FILENAME
 
-# --- 2. Append to global db.parquet ---
-if global_db_path.exists():
-    db = pl.read_parquet(global_db_path)
-    db = pl.concat([db, merged], how="vertical_relaxed")
-    print("[INFO] Appended to existing db.parquet")
-else:
-    db = merged
-    print("[INFO] Created new db.parquet")
+    # --- 1. Build the batch table from accumulated rows ---
+    if not rows_path.exists():
+        print(f"[ERROR] No {ROWS_FILENAME} found in {batch_dir}")
+        return
 
-db.write_parquet(global_db_path, compression="zstd")
-print(f"[INFO] Parquet db updated: {global_db_path}")
\ No newline at end of file
+    with open(rows_path) as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    # Derive miss rates for every method at once instead of per row in Python
+    df = pl.from_arrow(rows_to_table(rows))
+    df = df.with_columns([
+        safe_div_percent_expr(pl.col(misses), pl.col(loads)).alias(name)
+        for name, (misses, loads) in MISS_PERCENT_FIELDS.items()
+    ])
+
+    table = df.to_arrow().cast(SCHEMA_ARROW).sort_by("Timestamp")
+
+    pq.write_table(
+        table,
+        output_path,
+        compression="zstd",
+        compression_level=3,
+        write_statistics=True,
+        data_page_size=1_048_576,
+    )
+    print(f"[INFO] Merged batch saved: {output_path}")
+
+    # --- 2. Append to global partitioned DB ---
+    # Only the new BatchID partition is written; existing history is never re-read.
+    write_db_partitions(table, global_db_path)
+    print(f"[INFO] Parquet db updated: {global_db_path}")
+
+    rows_path.unlink()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: combine_batch_parquets.py <batch_dir> <output_file>")
+        sys.exit(1)
+
+    combine_batch(sys.argv[1], sys.argv[2])
@@ -3,103 +3,145 @@
 # ===========================================
 
 ## \file gen_perf_parquet_logs.py
-## \brief Generates perf benchmarking parquet from command-line arguments.
+## \brief Records per-method perf benchmarking rows from a JSON run payload.
 ## 
 ## \details
 ## \par Description
-##     Accepts raw performance metrics from `perf stat` as arguments.
-##     Computes % miss rates for cache levels and TLB, as well as misses per trial.
-##     Saves results to a timestamped `.parquet` file in a structured batch directory,
-##     and also generates a global merged file if needed.
+##     Accepts raw performance metrics from `perf stat` as a single JSON object on stdin.
+##     Records raw counters and per-trial metrics; % miss rates are derived later for the
+##     whole batch with vectorized Polars expressions in `combine_batch_parquets.py`.
+##     Appends the row as one JSON line to the batch's `rows.jsonl` side-file.
+##     No per-method file is encoded: `combine_batch_parquets.py` later turns all
+##     rows of the batch into a single Arrow table and writes the parquet outputs once.
+## 
+##     If the payload contains `log_path`, the perf CSV is parsed in-process via
+##     `parse_perf_metrics()`, so only the run identity fields need to be supplied.
 ## 
 ## \par Usage (example)
 ## ```bash
-## python3 gen_perf_parquet_logs.py \
-##   --out_path "db/logs/batch_<BATCHID>/perf_results_<METHOD>_<TIMESTAMP>_<BATCHID>.parquet" \
-##   --timestamp "2025-05-13_17-00-20" \
-##   --batchid "a7d38b57" \
-##   --method "SIMD" \
-##   --trials 100000000 \
-##   --cycles 6010711137 \
-##   --instr 8123412345 \
-##   --ipc 1.35 \
-##   --wall_time_s 0.08058 \
-##   --wall_time_ns 80587148 \
-##   --cache_loads 100000 \
-##   --cache_miss 5000 \
-##   --l1_loads 10000000 \
-##   --l1_misses 30000 \
-##   --l2_loads 200000 \
-##   --l2_misses 10000 \
-##   --l3_loads 100000 \
-##   --l3_misses 8000 \
-##   --tlb_loads 1200 \
-##   --tlb_misses 80 \
-##   --branch_instr 700000000 \
-##   --branch_misses 50000 \
-##   --miss_per_trial 0.0009 \
-##   --cycles_per_trial 16.9609
+## echo '{
+##   "batch_dir": "db/logs/batch_<BATCHID>_<TIMESTAMP>",
+##   "log_path": "db/logs/batch_<BATCHID>/perf_<METHOD>_<TIMESTAMP>.csv",
+##   "timestamp": "2025-05-13 17:00:20",
+##   "batchid": "a7d38b57",
+##   "method": "SIMD",
+##   "trials": 100000000,
+##   "wall_time_s": 0.08058,
+##   "wall_time_ns": 80587148
+## }' | python3 gen_perf_parquet_logs.py
 ## ```
 ## 
+##     Without `log_path`, every metric key (`cycles`, `instr`, `ipc`, `cache_loads`, ...,
+##     `cycles_per_trial`) must be present, e.g. from `parse_perf_metrics.py --json`.
+## 
 ## \par Output
-##     - File: logs/batch_<batchid>_<timestamp>/perf_results_<method>_<timestamp>_<batchid>.parquet
-##     - Format: compressed `zstd` parquet with labeled fields and derived metrics
+##     - File: logs/batch_<batchid>_<timestamp>/rows.jsonl (one line per method, consumed by the combine step)
+##     - Format: raw labeled fields and derived metrics, typed later via `rows_to_table()`
 
 
-from pipeline.utils import safe_vector_cast, safe_div_percent
-from pipeline.schema import SCHEMA
+from pipeline.parse_perf_metrics import parse_perf_metrics
+from pipeline.schema import SCHEMA_ARROW
 
+from types import SimpleNamespace
+from datetime import datetime
 from pathlib import Path
-from glob import glob
-import polars as pl
-import argparse
+import pyarrow as pa
+import json
+import sys
+import os
+
+## Format of the per-method `timestamp` payload field.
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+## Root folder holding `batch_<batchid>_<timestamp>` directories.
+LOGS_DIR = "db/logs"
+
+## Side-file in each batch directory that accumulates one JSON row per method.
+ROWS_FILENAME = "rows.jsonl"
+
+def load_payload(payload: dict) -> SimpleNamespace:
+    """!Builds the `append_row` argument namespace from a JSON run payload.
+
+    @param payload Run identity fields plus either every perf metric or a `log_path` to parse.
+
+    @return Namespace with one attribute per payload/metric key.
+    """
+    if "log_path" in payload:
+        payload = {**payload, **parse_perf_metrics(payload["log_path"], payload["trials"])}
+    return SimpleNamespace(**payload)
 
 def parse_args():
-    parser = argparse.ArgumentParser(description="Parse perf stats for Monte Carlo benchmarking.")
-    parser.add_argument("--out_path", required=True, help="Output .parquet file path")
-    
-    parser.add_argument("--wall_time_s", required=True, help="Wall time (seconds)")
-    parser.add_argument("--wall_time_ns", required=True, help="Wall time (nanoseconds)")
+    """!Reads the run payload as a single JSON object from stdin.
 
-    parser.add_argument("--timestamp", required=True, help="Timestamp for the benchmark run")
-    parser.add_argument("--batchid", required=True, help="Unique ID for this batch of trials")
-    parser.add_argument("--method", required=True, help="Benchmarking method (e.g., SIMD, Pool, etc.)")
+    @return Namespace with one attribute per payload/metric key.
+    """
+    return load_payload(json.load(sys.stdin))
 
-    parser.add_argument("--trials", required=True, help="Number of trials run")
-    parser.add_argument("--cycles", required=True, help="CPU cycles")
-    parser.add_argument("--instr", required=True, help="Instructions executed")
-    parser.add_argument("--ipc", required=True, help="Instructions per cycle")
+def to_arrow_scalar(value, arrow_type: pa.DataType):
+    """!Converts a raw payload value into the Python type expected by an Arrow field.
 
-    parser.add_argument("--cache_loads", required=True, help="Cache loads")
-    parser.add_argument("--cache_miss", required=True, help="Cache misses")
+    @param value Raw value (string, number, "NA", or None).
+    @param arrow_type Target Arrow type of the column.
 
-    parser.add_argument("--l1_loads", required=True, help="L1 data cache loads")
-    parser.add_argument("--l1_misses", required=True, help="L1 data cache misses")
+    @return The converted value, or None for "NA"/missing input.
+    """
+    if value is None or value == "NA":
+        return None
+    if pa.types.is_integer(arrow_type):
+        return int(value)
+    if pa.types.is_floating(arrow_type):
+        return float(value)
+    if pa.types.is_timestamp(arrow_type):
+        return datetime.strptime(value, TIMESTAMP_FORMAT)
+    return str(value)
 
-    parser.add_argument("--l2_loads", required=True, help="L2 data cache loads")
-    parser.add_argument("--l2_misses", required=True, help="L2 data cache misses")
+def rows_to_table(rows: list) -> pa.Table:
+    """!Builds one typed Arrow table from raw rows, skipping dtype inference and casts.
 
-    parser.add_argument("--l3_loads", required=True, help="L3 data cache loads")
-    parser.add_argument("--l3_misses", required=True, help="L3 data cache misses")
+    @param rows List of raw row dicts as written by `append_row`.
 
-    parser.add_argument("--tlb_loads", required=True, help="TLB loads")
-    parser.add_argument("--tlb_misses", required=True, help="TLB misses")
+    @return Arrow table with `SCHEMA_ARROW` columns.
+    """
+    arrays = [
+        pa.array([to_arrow_scalar(row.get(f.name), f.type) for row in rows], type=f.type)
+        for f in SCHEMA_ARROW
+    ]
+    return pa.Table.from_arrays(arrays, schema=SCHEMA_ARROW)
 
-    parser.add_argument("--branch_instr", required=True, help="Branch instructions")
-    parser.add_argument("--branch_misses", required=True, help="Branch misses")
+def find_batch_dir(args) -> Path:
+    """!Resolves the batch directory for a run without globbing or sorting `db/logs`.
 
-    parser.add_argument("--miss_per_trial", required=True, help="Cache+TLB misses per trial")
-    parser.add_argument("--cycles_per_trial", required=True, help="Cycles per trial")
-    
-    return parser.parse_args()
+    Uses the payload's `batch_dir` when given (as `run_perf.sh` does). Otherwise a
+    single `os.scandir` pass returns the first `batch_<batchid>_*` directory.
 
-def update_parquet(args):
-    matches = sorted(glob(f"db/logs/batch_{args.batchid}_*"))
-    if not matches:
-        raise FileNotFoundError(f"No batch directory found for batch ID {args.batchid}")
-    batch_dir = Path(matches[-1])
+    @param args Namespace from `load_payload`.
 
-    parquet_path = batch_dir / f"perf_results_{args.method}_{args.timestamp}_{args.batchid}.parquet"
+    @return Path to the batch directory.
+
+    @throws FileNotFoundError If no matching batch directory exists.
+    """
+    batch_dir = getattr(args, "batch_dir", None)
+    if batch_dir is not None:
+        if not os.path.isdir(batch_dir):
+            raise FileNotFoundError(f"Batch directory not found: {batch_dir}")
+        return Path(batch_dir)
+
+    prefix = f"batch_{args.batchid}_"
+    with os.scandir(LOGS_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(prefix) and entry.is_dir():
+                return Path(entry.path)
+
+    raise FileNotFoundError(f"No batch directory found for batch ID {args.batchid}")
+
+def append_row(args):
+    """!Appends one method's metrics as a JSON line to the batch's `rows.jsonl`.
+
+    @param args Namespace from `load_payload` with run identity fields and perf metrics.
+
+    @throws FileNotFoundError If the batch directory does not exist.
+    """
+    rows_path = find_batch_dir(args) / ROWS_FILENAME
 
     # 1. Build the raw row (match SCHEMA field names exactly)
     row = {
@@ -114,42 +156,27 @@ def update_parquet(args):
         "Wall Time (ns)": args.wall_time_ns,
         "Cache Loads": args.cache_loads,
         "Cache Misses": args.cache_miss,
-        "Cache Miss %": safe_div_percent(args.cache_miss, args.cache_loads),
         "L1 Loads": args.l1_loads,
         "L1 Misses": args.l1_misses,
-        "L1 Miss %": safe_div_percent(args.l1_misses, args.l1_loads),
         "L2 Loads": args.l2_loads,
         "L2 Misses": args.l2_misses,
-        "L2 Miss %": safe_div_percent(args.l2_misses, args.l2_loads),
         "L3 Loads": args.l3_loads,
         "L3 Misses": args.l3_misses,
-        "L3 Miss %": safe_div_percent(args.l3_misses, args.l3_loads),
         "TLB Loads": args.tlb_loads,
         "TLB Misses": args.tlb_misses,
-        "TLB Miss %": safe_div_percent(args.tlb_misses, args.tlb_loads),
         "Branch Instructions": args.branch_instr,
         "Branch Misses": args.branch_misses,
-        "Branch Miss %": safe_div_percent(args.branch_misses, args.branch_instr),
         "Misses/Trial": args.miss_per_trial,
         "Cycles/Trial": args.cycles_per_trial,
     }
 
-    row = {k: (None if v == "NA" else v) for k, v in row.items()}
-
-    # 2. Create DataFrame and cast using schema
-    df = pl.DataFrame([row])
-    
-    # 3. Convert string timestamp to datetime
-    df = df.with_columns([
-    pl.col("Timestamp").str.strptime(pl.Datetime("ms"), "%Y-%m-%d %H:%M:%S", strict=False)
-    ])
-
-    df = safe_vector_cast(df, SCHEMA)
+    # 2. Derived miss-% columns are filled in by the combine step
 
-    df.write_parquet(parquet_path, compression="zstd")
+    with open(rows_path, "a") as f:
+        f.write(json.dumps(row) + "\n")
 
-    print(f"[INFO] Parquet saved: {parquet_path}")
+    print(f"[INFO] Row for {args.method} appended: {rows_path}")
 
 if __name__ == "__main__":
     args = parse_args()
-    update_parquet(args)
+    append_row(args)
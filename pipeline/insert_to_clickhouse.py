@@ -9,73 +9,180 @@
 ## \par Description
 ##     This script reads a Parquet dataset, filters it by BatchID, and inserts
 ##     the matching records into the `benchmark.performance` table in ClickHouse.
-##     It uses the clickhouse-driver to perform inserts and ensures that the
-##     table schema matches the format defined in `pipeline.schema`.
+##     It uses clickhouse-connect's `insert_arrow` to ship the rows as an Arrow
+##     stream over HTTP (no per-row Python objects). No cast pass is needed:
+##     the DB is written with `pipeline.schema.SCHEMA_ARROW`, so columns are
+##     already typed when scanned.
 ## 
 ## \par Usage
 ##     $ python3 insert_to_clickhouse.py --batchid <BATCH_ID>
+##     $ python3 insert_to_clickhouse.py --serve
 ## 
 ## \par Example
 ##     $ python3 insert_to_clickhouse.py --batchid "batch_202405"
 ## 
 ## \par Notes
-##     - ClickHouse connection parameters are loaded from `.env`via `scripts/config.py`
-##     - The Parquet file path is set in `DB_PATH`
+##     - ClickHouse connection parameters are loaded from `.env` via `scripts/config.py`
+##       on first use, so importing this module does not touch disk
+##     - The partitioned Parquet DB path is set in `DB_PATH`
+##     - The BatchID filter is resolved at the storage layer: only `<DB_PATH>/BatchID=<id>/`
+##       is opened, which is stricter than row-group min/max pruning on a single file
 ##     - You may call `insert_batch(batch_id)` directly from other scripts or notebooks
+##     - `--serve` runs a long-lived ingester on the unix socket at `INGEST_SOCKET_PATH`,
+##       keeping imports and the ClickHouse client alive across batches; `--batchid`
+##       hands the batch to that ingester when one is running and otherwise inserts in-process
+##     - Polars/pyarrow/clickhouse-connect are imported on first insert, so handing
+##       a batch to a running ingester stays cheap
 
 
 import argparse
-import polars as pl
-from clickhouse_driver import Client
-from pipeline.schema import SCHEMA
-from pipeline.utils import safe_vector_cast
-from scripts.config import *
+import socket
+import socketserver
+from pathlib import Path
+from scripts.config import get_config
+
+
+"""!Unix socket the `--serve` ingester listens on; one batch ID per connection."""
+INGEST_SOCKET_PATH = Path("db/ingest.sock")
+
+_CLIENT = None
+
+
+def get_client():
+    """!Returns the process-wide ClickHouse client, creating it on first use.
+
+    Reusing one client keeps its HTTP connection pool alive across inserts, so
+    long-lived callers (e.g. `pipeline/worker.py`) pay connection setup only once.
+
+    @return A clickhouse-connect client.
+    """
+    global _CLIENT
+    if _CLIENT is None:
+        import clickhouse_connect
+
+        cfg = get_config()
+        _CLIENT = clickhouse_connect.get_client(
+            host=cfg.CLICKHOUSE_HOST,
+            port=cfg.CLICKHOUSE_HTTP_PORT,
+            username=cfg.CLICKHOUSE_USER,
+            password=cfg.CLICKHOUSE_PASSWORD,
+            compress="lz4"
+        )
+    return _CLIENT
 
 
 def insert_batch(batch_id: str) -> None:
     """!Filters and inserts a batch of records into ClickHouse.
 
-    Loads data from the Parquet file at DB_PATH, filters by BatchID,
-    and inserts the resulting records into the `benchmark.performance` table.
+    Scans only the `BatchID=<batch_id>` partition of the Parquet DB at DB_PATH
+    (no full-history read or directory walk) and streams it into the
+    `benchmark.performance` table one Arrow record batch at a time, so peak
+    memory is bounded by DB_STREAM_BATCH_ROWS rows rather than the whole batch.
+    Partitions are written sorted by (Method, Timestamp), so rows already arrive
+    in the table's ORDER BY order.
 
     @param batch_id The BatchID to filter the dataset on.
 
     @throws Exception If ClickHouse insert fails.
     """
-    df = pl.read_parquet(DB_PATH)
-    df = df.filter(pl.col("BatchID") == batch_id)
-
-    # Optional: enforce schema casting
-    df = safe_vector_cast(df, SCHEMA)
+    from pipeline.utils import DB_STREAM_BATCH_ROWS, open_db_dataset
+    from pipeline.schema import SCHEMA
+    import pyarrow as pa
 
-    client = Client(
-        host=CLICKHOUSE_HOST,
-        port=CLICKHOUSE_TCP_PORT,
-        user=CLICKHOUSE_USER,
-        password=CLICKHOUSE_PASSWORD
-    )
-
-    records = df.to_dicts()
+    dataset = open_db_dataset(get_config().DB_PATH, batch_id=batch_id)
+    client = get_client()
+    inserted = 0
 
     try:
-        client.execute("INSERT INTO benchmark.performance VALUES", records)
+        for batch in dataset.to_batches(columns=list(SCHEMA), batch_size=DB_STREAM_BATCH_ROWS):
+            client.insert_arrow("benchmark.performance", pa.Table.from_batches([batch]))
+            inserted += batch.num_rows
     except Exception as e:
         print(f"[ERROR] Error inserting records into ClickHouse: {e}")
         raise
 
-    print(f"[INFO] Inserted {len(records)} records into ClickHouse for batch '{batch_id}'.")
+    print(f"[INFO] Inserted {inserted} records into ClickHouse for batch '{batch_id}'.")
+
+
+class IngestHandler(socketserver.StreamRequestHandler):
+    """!Handles one ingest request: reads a batch ID line, replies `ok` or `error: <message>`.
+    """
+
+    def handle(self):
+        batch_id = self.rfile.readline().decode().strip()
+        try:
+            insert_batch(batch_id)
+            reply = "ok"
+        except Exception as e:
+            reply = f"error: {e}"
+        self.wfile.write(f"{reply}\n".encode())
+
+
+def serve(socket_path: Path = INGEST_SOCKET_PATH) -> None:
+    """!Runs the long-lived ingester on a unix socket until interrupted.
+
+    Requests are handled one at a time, so every batch reuses the same process
+    imports and ClickHouse client (see `get_client`).
+
+    @param socket_path Filesystem path of the unix socket to listen on.
+    """
+    socket_path.unlink(missing_ok=True)
+
+    with socketserver.UnixStreamServer(str(socket_path), IngestHandler) as server:
+        print(f"[INFO] Ingester listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def request_insert(batch_id: str, socket_path: Path = INGEST_SOCKET_PATH) -> bool:
+    """!Hands a batch to a running ingester, if there is one.
+
+    @param batch_id The BatchID to ingest.
+    @param socket_path Filesystem path of the ingester's unix socket.
+
+    @return True if the ingester inserted the batch, False if no ingester is listening.
+
+    @throws RuntimeError If the ingester reports a failed insert.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(socket_path))
+            sock.sendall(f"{batch_id}\n".encode())
+            reply = sock.makefile().readline().strip()
+    except (FileNotFoundError, ConnectionRefusedError):
+        return False
+
+    if reply != "ok":
+        raise RuntimeError(f"Ingester failed for batch '{batch_id}': {reply}")
+
+    print(f"[INFO] Batch '{batch_id}' inserted by ingester at {socket_path}.")
+    return True
 
 
 def main():
     """!CLI entrypoint for inserting a batch into ClickHouse.
 
-    Parses --batchid from command-line arguments and performs the insert.
+    With --serve, runs the long-lived ingester. Otherwise parses --batchid and
+    forwards it to a running ingester, falling back to an in-process insert.
     """
     parser = argparse.ArgumentParser(description="Insert benchmarking logs into ClickHouse")
-    parser.add_argument("--batchid", type=str, required=True, help="Batch ID to ingest")
+    parser.add_argument("--batchid", type=str, help="Batch ID to ingest")
+    parser.add_argument("--serve", action="store_true", help="Run a long-lived ingester on INGEST_SOCKET_PATH")
     args = parser.parse_args()
 
-    insert_batch(args.batchid)
+    if args.serve:
+        serve()
+        return
+
+    if args.batchid is None:
+        parser.error("--batchid is required unless --serve is given")
+
+    if not request_insert(args.batchid):
+        insert_batch(args.batchid)
 
 
 if __name__ == "__main__":
@@ -6,7 +6,8 @@
 ## \brief CLI flag generator from perf CSV output (`perf stat -x,`)
 ##
 ## \details
-## Parses Linux `perf stat` logs in CSV format and extracts a fixed set
+## Parses Linux `perf stat` logs in CSV format with the standard library `csv`
+## module (no polars import, to keep per-method startup cheap) and extracts a fixed set
 ## of performance metrics. Outputs these metrics as `--key value` shell
 ## arguments for downstream use in pipeline scripts or shell evaluation.
 ##
@@ -29,28 +30,27 @@
 ##
 ## \par Usage
 ## \code
-## python3 parse_perf_metrics.py <perf_log.csv> <num_trials>
+## python3 parse_perf_metrics.py <perf_log.csv> <num_trials> [--json]
 ## \endcode
 ##
 ## \par Arguments
 ## - `<perf_log.csv>` — Path to perf CSV file (from `perf stat -x,`)
 ## - `<num_trials>` — Number of simulation trials (used for normalization)
+## - `--json` — Emit a JSON object (lowercase keys) instead of `KEY=value` flags,
+##   suitable for piping into `gen_perf_parquet_logs.py`
 ##
 ## \note
 ## - L2/L3 metrics are set to `"NA"` unless enabled manually via raw PMU events.
-## - Designed for use via `eval` in shell pipelines or programmatically via subprocess.
+## - Designed for use via `eval` in shell pipelines, or import `parse_perf_metrics()` directly
+##   (as `pipeline/worker.py` does).
 ## - Will safely skip unsupported perf fields and calculate derived metrics (e.g., IPC, miss rate).
 
 
-from pipeline.utils import safe_div
-import polars as pl
+from pipeline.safe_math import safe_div
+import json
+import csv
 import sys
 
-trials = int(sys.argv[2])
-
-df = pl.read_csv(sys.argv[1], has_header=False)
-df.columns = ["value", "col1", "event", "timestamp", "cpu%", "derived", "label"]
-
 field_map = {
     "cycles": "cycles:u",
     "instr": "instructions:u",
@@ -69,26 +69,6 @@ field_map = {
 }
 
 event_to_key = {v: k for k, v in field_map.items() if v != "NA"}
-filtered = df.filter(pl.col("event").is_in(event_to_key.keys()))
-
-# Detect non-numeric values (e.g. "<not supported>", "N/A")
-to_clean = (
-    pl.when(pl.col("value").cast(pl.Float64, strict=False).is_null())
-      .then(pl.lit("NA"))
-      .otherwise(pl.col("value").cast(pl.Utf8))  # stringify numeric
-)
-
-filtered = filtered.with_columns([to_clean.alias("clean_value")])
-
-values = {key: "NA" for key in field_map}
-
-for row in filtered.iter_rows(named=True):
-    cli_key = event_to_key[row["event"]]
-    values[cli_key] = row["clean_value"]
-
-values["ipc"] = safe_div(values["instr"], values["cycles"])
-values["miss_per_trial"] = safe_div(values["cache_miss"], trials)
-values["cycles_per_trial"] = safe_div(values["cycles"], trials)
 
 # Ordered output for clean downstream piping
 ordered_keys = [
@@ -102,13 +82,56 @@ ordered_keys = [
     "miss_per_trial", "cycles_per_trial"
 ]
 
+
+def clean_value(raw: str) -> str:
+    """!Returns a perf counter value as-is, or "NA" if it is non-numeric (e.g. "<not supported>", "N/A").
+
+    @param raw Raw value column from the perf CSV.
+
+    @return The original string, or "NA".
+    """
+    try:
+        float(raw)
+        return raw
+    except ValueError:
+        return "NA"
+
+def parse_perf_metrics(log_path, trials) -> dict:
+    """!Extracts the tracked perf counters and derived metrics from a perf CSV log.
+
+    @param log_path Path to the perf CSV file (from `perf stat -x,`).
+    @param trials Number of simulation trials, used for per-trial normalization.
+
+    @return Dict keyed by `ordered_keys` with string/float values, or "NA" when unavailable.
+    """
+    trials = int(trials)
+
+    # perf stat -x, columns: value, unit, event, run time, run %, derived, label
+    with open(log_path, newline="") as f:
+        rows = [row for row in csv.reader(f) if len(row) > 2 and not row[0].startswith("#")]
+
+    values = {key: "NA" for key in field_map}
+    values.update({event_to_key[row[2]]: clean_value(row[0]) for row in rows if row[2] in event_to_key})
+
+    values["ipc"] = safe_div(values["instr"], values["cycles"])
+    values["miss_per_trial"] = safe_div(values["cache_miss"], trials)
+    values["cycles_per_trial"] = safe_div(values["cycles"], trials)
+
+    return values
+
 # Debugging output
 def debug_print(values: dict):
     for k in ordered_keys:
         print(f"[DEBUG] {k} = {values.get(k)}", file=sys.stderr)
 
 
-print(" ".join([
-    f"{k.upper()}={values[k]}"
-    for k in ordered_keys
-]))
\ No newline at end of file
+if __name__ == "__main__":
+    values = parse_perf_metrics(sys.argv[1], sys.argv[2])
+
+    if "--json" in sys.argv[3:]:
+        print(json.dumps({k: values[k] for k in ordered_keys}))
+    else:
+        print(" ".join([
+            f"{k.upper()}={values[k]}"
+            for k in ordered_keys
+        ]))
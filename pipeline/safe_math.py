@@ -0,0 +1,88 @@
+# ===========================================
+# safe_math.py
+# ===========================================
+
+## \file safe_math.py
+## \brief Dependency-free arithmetic helpers with "NA" fallback.
+## 
+## \details
+## \par Description
+##     Scalar division helpers shared by the pipeline scripts. This module imports
+##     nothing beyond the standard library so that lightweight CLI steps such as
+##     `parse_perf_metrics.py` can use it without paying the polars/pyarrow import cost.
+## 
+## \par Included Utilities
+##     - `safe_div`: Division with fallback for invalid or "NA" input  
+##     - `safe_div_percent`: Percentage-style division with "NA" guard  
+## 
+## \par Usage
+##     from pipeline.safe_math import safe_div, safe_div_percent
+## 
+## \par Notes
+##     - Both helpers are re-exported from `pipeline.utils` for existing callers
+##     - `safe_div_percent` hands numpy arrays to the Numba kernel in `pipeline._fastmath`,
+##       imported only on that path
+
+
+def _is_array(value) -> bool:
+    """!Tells whether a value is a column-like input (list, tuple, numpy array, or Polars/pandas Series).
+
+    Checked by duck typing so this module never has to import numpy or polars.
+
+    @param value Candidate input.
+
+    @return True if the value should go through the array path.
+    """
+    return isinstance(value, (list, tuple)) or getattr(value, "ndim", 0) > 0 or hasattr(value, "to_numpy")
+
+def safe_div(numerator, denominator):
+    """!Safely performs division, handling 'NA' values and invalid input.
+
+    Returns a rounded division result unless input is invalid or contains the string "NA",
+    in which case "NA" is returned instead.
+
+    @param numerator Numerator of the division (can be int, float, or "NA").
+    @param denominator Denominator of the division (can be int, float, or "NA").
+
+    @return Result of division rounded to 4 decimal places, or "NA" if invalid.
+    """
+    try:
+        if "NA" in (numerator, denominator):
+            return "NA"
+        
+        num = float(numerator)
+        denom = float(denominator)
+
+        return round(num / denom, 4)
+    except:
+        return "NA"
+
+def safe_div_percent(numerator, denominator):
+    """!Computes percentage-based division safely, with 'NA' fallback.
+
+    Similar to safe_div, but multiplies the result by 100 to express it as a percent.
+    Invalid input or "NA" strings will return "NA" as a string. Column-like inputs
+    (lists, tuples, numpy arrays, Polars Series) are dispatched to the compiled
+    bulk kernel in `pipeline._fastmath`.
+
+    @param numerator Numerator of the division (can be int, float, "NA", or a column).
+    @param denominator Denominator of the division (can be int, float, "NA", or a column).
+
+    @return Percentage value (rounded to 4 decimals), or "NA" if invalid;
+            for columns, a float64 array with NaN for invalid or null entries.
+    """
+    if _is_array(numerator) or _is_array(denominator):
+        # Imported here so scalar callers never load numpy/numba
+        from pipeline._fastmath import safe_div_percent_array
+        return safe_div_percent_array(numerator, denominator)
+
+    try:
+        if "NA" in (numerator, denominator):
+            return "NA"
+        
+        num = float(numerator)
+        denom = float(denominator)
+
+        return round((num / denom) * 100, 4)
+    except:
+        return "NA"
@@ -16,14 +16,17 @@
 ## \par Format
 ##     SCHEMA = {
 ##         "Column Name": (Polars DataType, is_nullable: bool),
+##         "Column Name": (Polars DataType, is_nullable: bool, clickhouse_override: str),
 ##         ...
 ##     }
 ## 
 ## \par Design Notes
 ##     - All timestamps use millisecond-resolution Datetime
-##     - Percent fields are stored as Float64 (0–100%)
+##     - Percent fields are stored as Float64 (0–100%) in Parquet; ClickHouse opts into
+##       Float32 via the third tuple element, since values are rounded to 4 decimals
 ##     - L2/L3-related fields are nullable by default (may not be available on all CPUs)
 ##     - Field names match CSV headers and ClickHouse columns exactly
+##     - `SCHEMA_PL` / `SCHEMA_ARROW` are precomputed views for Polars and Arrow writers
 
 
 import polars as pl
@@ -32,7 +35,9 @@ import polars as pl
 """!Canonical schema used throughout the pipeline.
 
 Each key represents a column name, and the value is a tuple:
-(dtype: pl.DataType, nullable: bool). This schema is used to:
+(dtype: pl.DataType, nullable: bool[, clickhouse_override: str]). The optional
+third element explicitly picks a narrower ClickHouse column type; precision is
+never downshifted implicitly. This schema is used to:
 - Cast raw CSV data safely
 - Generate ClickHouse-compatible SQL
 - Validate data consistency during preprocessing
@@ -53,25 +58,36 @@ SCHEMA = {
     "Wall Time (ns)": (pl.Int64(), False),
     "Cache Loads": (pl.Int64(), False),
     "Cache Misses": (pl.Int64(), False),
-    "Cache Miss %": (pl.Float64(), False),
+    "Cache Miss %": (pl.Float64(), False, "Float32"),
     "L1 Loads": (pl.Int64(), False),
     "L1 Misses": (pl.Int64(), False),
-    "L1 Miss %": (pl.Float64(), False),
+    "L1 Miss %": (pl.Float64(), False, "Float32"),
 
     # Nullable fields
     "L2 Loads": (pl.Int64(), True),
     "L2 Misses": (pl.Int64(), True),
-    "L2 Miss %": (pl.Float64(), True),
+    "L2 Miss %": (pl.Float64(), True, "Float32"),
     "L3 Loads": (pl.Int64(), True),
     "L3 Misses": (pl.Int64(), True),
-    "L3 Miss %": (pl.Float64(), True),
+    "L3 Miss %": (pl.Float64(), True, "Float32"),
 
     "TLB Loads": (pl.Int64(), False),
     "TLB Misses": (pl.Int64(), False),
-    "TLB Miss %": (pl.Float64(), False),
+    "TLB Miss %": (pl.Float64(), False, "Float32"),
     "Branch Instructions": (pl.Int64(), False),
     "Branch Misses": (pl.Int64(), False),
-    "Branch Miss %": (pl.Float64(), False),
+    "Branch Miss %": (pl.Float64(), False, "Float32"),
     "Misses/Trial": (pl.Float64(), False),
     "Cycles/Trial": (pl.Float64(), False),
-}
\ No newline at end of file
+}
+
+
+"""!Plain `{column: Polars dtype}` view of SCHEMA, usable as a Polars `schema=` argument."""
+SCHEMA_PL = {name: spec[0] for name, spec in SCHEMA.items()}
+
+"""!Arrow schema equivalent of SCHEMA, computed once at import.
+
+Used to build and write typed Arrow tables directly, so rows never need a
+separate cast pass through `safe_vector_cast`.
+"""
+SCHEMA_ARROW = pl.DataFrame(schema=SCHEMA_PL).to_arrow().schema
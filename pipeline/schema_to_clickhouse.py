@@ -10,7 +10,9 @@
 ## CREATE TABLE statement. This allows seamless integration between data preprocessing
 ## with Polars and persistent storage in ClickHouse.
 ##
-## The schema is defined as a dictionary mapping field names to (dtype, nullable) pairs.
+## The schema is defined as a dictionary mapping field names to (dtype, nullable) pairs,
+## optionally extended to (dtype, nullable, clickhouse_override) to opt a column into a
+## narrower ClickHouse type (e.g. "Float32" for percentages).
 ## Supported input dtypes include both string representations (e.g., "Utf8") and
 ## Polars type objects or classes (e.g., pl.Int64).
 ##
@@ -28,6 +30,7 @@
 ## \par Features
 ## - Handles both string-based and Polars-native dtype declarations
 ## - Adds Nullable(...) wrappers where needed
+## - Honors explicit per-field ClickHouse type overrides (precision downshift is opt-in only)
 ## - Raises errors for unsupported or unrecognized dtypes
 ## - Keeps output consistent with the expected schema in `pipeline.schema`
 ##
@@ -42,59 +45,74 @@
 ## SCHEMA = {
 ##     "FieldName": (pl.Int64, False),
 ##     "OtherField": ("Utf8", True),
+##     "Percent": (pl.Float64, False, "Float32"),
 ##     ...
 ## }
 ## \endcode
 
 from pipeline.schema import SCHEMA
+from functools import lru_cache
 import polars as pl
 
-def polars_to_clickhouse_dtype(dtype, nullable):
+"""!ClickHouse types for string dtype names (e.g. "Utf8")."""
+STR_DTYPE_MAP = {
+    "String": "String",
+    "Utf8": "String",
+    "Int64": "Int64",
+    "Float64": "Float64",
+    "Datetime": "DateTime64(3)",
+}
+
+"""!ClickHouse types keyed by Polars dtype class, so lookups need no isinstance chain."""
+CLS_DTYPE_MAP = {
+    pl.Utf8: "String",
+    pl.String: "String",
+    pl.Int64: "Int64",
+    pl.Float64: "Float64",
+    pl.Datetime: "DateTime64(3)",
+}
+
+
+@lru_cache(maxsize=64)
+def polars_to_clickhouse_dtype(dtype, nullable, ch_override=None):
     """!Converts a Polars data type to a valid ClickHouse column type.
 
     This function normalizes the input dtype, whether it's a string (e.g., "Utf8"),
     a Polars dtype class (e.g., pl.Int64), or an instantiated Polars dtype.
+    Results are memoized on the (hashable) arguments.
 
     @param dtype The input data type (string, Polars class, or Polars dtype object).
     @param nullable Whether to wrap the type in ClickHouse's Nullable().
+    @param ch_override Optional ClickHouse type that replaces the mapped type (e.g. "Float32").
 
     @return A string representing the ClickHouse-compatible column type.
 
     @throws ValueError If the dtype is not supported or recognized.
     """
-    if isinstance(dtype, str):
-        dtype_map = {
-            "String": "String",
-            "Utf8": "String",
-            "Int64": "Int64",
-            "Float64": "Float64",
-            "Datetime": "DateTime64(3)",
-        }
-        ch_type = dtype_map.get(dtype)
+    if ch_override is not None:
+        ch_type = ch_override
+
+    elif isinstance(dtype, str):
+        ch_type = STR_DTYPE_MAP.get(dtype)
         if ch_type is None:
             raise ValueError(f"Unsupported string dtype: {dtype}")
-        return f"Nullable({ch_type})" if nullable else ch_type
-
-    if isinstance(dtype, type):
-        dtype = dtype()
-
-    dtype_name = type(dtype).__name__
 
-    match dtype_name:
-        case "Utf8" | "String": ch_type = "String"
-        case "Int64": ch_type = "Int64"
-        case "Float64": ch_type = "Float64"
-        case "Datetime": ch_type = "DateTime64(3)"
-        case _: raise ValueError(f"Unsupported dtype: {dtype_name}")
+    else:
+        dtype_cls = dtype if isinstance(dtype, type) else type(dtype)
+        ch_type = CLS_DTYPE_MAP.get(dtype_cls)
+        if ch_type is None:
+            raise ValueError(f"Unsupported dtype: {dtype_cls.__name__}")
 
     return f"Nullable({ch_type})" if nullable else ch_type
 
 
+@lru_cache(maxsize=4)
 def generate_clickhouse_table(table_name="benchmark.performance"):
     """!Generates a CREATE TABLE SQL statement for ClickHouse.
 
     Converts the SCHEMA dictionary into a fully-typed ClickHouse DDL statement.
-    Each field is converted using polars_to_clickhouse_dtype().
+    Each field is converted using polars_to_clickhouse_dtype(). SCHEMA is static,
+    so the statement is memoized per table name.
 
     @param table_name The name of the target ClickHouse table.
 
@@ -102,11 +120,10 @@ def generate_clickhouse_table(table_name="benchmark.performance"):
 
     @note Uses MergeTree engine and orders by (Method, Timestamp).
     """
-    lines = []
-
-    for name, (dtype, nullable) in SCHEMA.items():
-        ch_type = polars_to_clickhouse_dtype(dtype, nullable)
-        lines.append(f"    `{name}` {ch_type},")
+    lines = [
+        f"    `{name}` {polars_to_clickhouse_dtype(dtype, nullable, *override)},"
+        for name, (dtype, nullable, *override) in SCHEMA.items()
+    ]
 
     return f"""CREATE TABLE IF NOT EXISTS {table_name} (
 {chr(10).join(lines).rstrip(',')}
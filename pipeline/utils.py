@@ -15,27 +15,59 @@
 ##     - `safe_vector_cast`: Vectorized, schema-aware casting for Polars DataFrames  
 ##     - `safe_div`: Division with fallback for invalid or "NA" input  
 ##     - `safe_div_percent`: Percentage-style division with "NA" guard  
+##     - `safe_div_expr` / `safe_div_percent_expr`: Vectorized Polars equivalents of the above  
+##     - `write_db_partitions`: Appends rows to the BatchID-partitioned Parquet DB  
+##     - `migrate_single_file_db`: Converts a legacy single-file DB into the partitioned layout  
+##     - `open_db_dataset`: Opens the Parquet DB as a pyarrow dataset for batch streaming  
+##     - `scan_db`: Lazily scans the Parquet DB with partition pruning  
 ## 
 ## \par Usage
 ##     from utils import safe_vector_cast, safe_div, safe_div_percent
 ## 
 ## \par Design Notes
-##     - Schema mismatches are surfaced with detailed debug output
+##     - Missing columns are surfaced with detailed debug output; cast errors propagate from Polars as-is
 ##     - "NA" strings are treated as nulls when allow_na is True
 ##     - Division errors (e.g., zero division, bad input) are handled gracefully
 
 
-from pipeline.schema import SCHEMA
+from pipeline.safe_math import safe_div, safe_div_percent
+from pipeline.schema import SCHEMA, SCHEMA_ARROW
 from polars import col, when
+from pathlib import Path
+import shutil
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow as pa
 import polars as pl
 
 
+"""!Hive-style partitioning of the global Parquet DB (`<DB_PATH>/BatchID=<id>/part-0.parquet`).
+
+BatchID is pinned to its SCHEMA string type so IDs made of digits are never inferred as integers.
+"""
+DB_PARTITIONING = ds.partitioning(pa.schema([SCHEMA_ARROW.field("BatchID")]), flavor="hive")
+
+"""!Sort order of rows inside each DB partition; matches the ClickHouse `ORDER BY (Method, Timestamp)`."""
+DB_SORT_KEYS = [("Method", "ascending"), ("Timestamp", "ascending")]
+
+"""!Maximum rows per Parquet row group in the DB, keeping min/max statistics selective."""
+DB_ROW_GROUP_SIZE = 100_000
+
+"""!pyarrow's default cap on partitions per write; raised per call when a table spans more BatchIDs."""
+DB_MAX_PARTITIONS = 1024
+
+"""!Rows per Arrow record batch when streaming the DB into ClickHouse; bounds peak memory."""
+DB_STREAM_BATCH_ROWS = 65_536
+
+
 def safe_vector_cast(df: pl.DataFrame, schema: dict) -> pl.DataFrame:
     """!Cast a Polars DataFrame to match a declared schema, handling 'NA' strings as nulls.
 
     This function enforces schema alignment between a raw input DataFrame (typically from CSV)
     and a declared schema. If `allow_na` is True in the schema, string values like "NA" will be
-    replaced with nulls prior to casting.
+    replaced with nulls prior to casting. The replace is only emitted for columns that actually
+    contain "NA"; every other column is a plain cast, and columns already
+    in their target type are left untouched.
 
     @param df The input Polars DataFrame to cast.
     @param schema Dictionary in the format { column_name: (dtype, allow_na) }.
@@ -44,79 +76,169 @@ def safe_vector_cast(df: pl.DataFrame, schema: dict) -> pl.DataFrame:
 
     @throws ValueError If any schema field is missing in the DataFrame.
     """
-    try:
-        missing = [c for c in schema if c not in df.columns]
-
-        if missing:
-            print("SCHEMA MISMATCH DETECTED")
-            print("Expected columns (from schema):")
-            for s in schema:
-                print(f"  {s}")
-            print("Found columns (in DataFrame):")
-            for c in df.columns:
-                print(f"  {c}")
-            print("Missing columns:")
-            for m in missing:
-                print(f"  {m}")
-            raise ValueError(f"Schema mismatch: {len(missing)} missing column(s)")
-
-        casted = []
-
-        for c, (dtype, allow_na) in schema.items():
-            if allow_na and df[c].dtype == pl.Utf8:
-                expr = when(col(c) == "NA").then(None).otherwise(col(c)).cast(dtype).alias(c)
-            else:
-                expr = col(c).cast(dtype).alias(c)
-            casted.append(expr)
-
-        return df.with_columns(casted)
-    
-    except Exception as e:
-        print("[ERROR] safe_vector_cast failed:", e)
-        print("[DEBUG] DataFrame columns:", df.columns)
-        print("[DEBUG] Schema fields:", list(SCHEMA.keys()))
-        raise e
-
-def safe_div(numerator, denominator):
-    """!Safely performs division, handling 'NA' values and invalid input.
-
-    Returns a rounded division result unless input is invalid or contains the string "NA",
-    in which case "NA" is returned instead.
-
-    @param numerator Numerator of the division (can be int, float, or "NA").
-    @param denominator Denominator of the division (can be int, float, or "NA").
-
-    @return Result of division rounded to 4 decimal places, or "NA" if invalid.
+    # Resolve dtypes once from the frame schema instead of materializing each Series
+    df_schema = df.schema
+    missing = [c for c in schema if c not in df_schema]
+
+    if missing:
+        print("SCHEMA MISMATCH DETECTED")
+        print("Expected columns (from schema):")
+        for s in schema:
+            print(f"  {s}")
+        print("Found columns (in DataFrame):")
+        for c in df.columns:
+            print(f"  {c}")
+        print("Missing columns:")
+        for m in missing:
+            print(f"  {m}")
+        raise ValueError(f"Schema mismatch: {len(missing)} missing column(s)")
+
+    # Only nullable string columns can carry "NA"; check them all in one parallel pass
+    na_cols = [c for c, (_, allow_na, *_) in schema.items() if allow_na and df_schema[c] == pl.Utf8]
+    has_na = df.select([col(c).eq("NA").any().alias(c) for c in na_cols]).row(0, named=True) if na_cols else {}
+
+    casted = []
+
+    for c, (dtype, allow_na, *_) in schema.items():
+        # Columns already stored in their target type (e.g. Timestamp as Datetime("ms")) pass through
+        if df_schema[c] == dtype:
+            continue
+        if has_na.get(c):
+            expr = col(c).replace("NA", None).cast(dtype).alias(c)
+        else:
+            expr = col(c).cast(dtype).alias(c)
+        casted.append(expr)
+
+    return df.with_columns(casted)
+
+def safe_div_expr(num: pl.Expr, den: pl.Expr) -> pl.Expr:
+    """!Vectorized counterpart of `safe_div` for Polars columns.
+
+    "NA" strings are expected to already be nulls (see `safe_vector_cast`), so
+    only null and zero-denominator guards are needed.
+
+    @param num Numerator expression.
+    @param den Denominator expression.
+
+    @return Expression yielding the quotient rounded to 4 decimals, or null if invalid.
+    """
+    return when(num.is_null() | den.is_null() | (den == 0)).then(None).otherwise((num / den).round(4))
+
+def safe_div_percent_expr(num: pl.Expr, den: pl.Expr) -> pl.Expr:
+    """!Vectorized counterpart of `safe_div_percent` for Polars columns.
+
+    @param num Numerator expression.
+    @param den Denominator expression.
+
+    @return Expression yielding the percentage rounded to 4 decimals, or null if invalid.
+    """
+    return when(num.is_null() | den.is_null() | (den == 0)).then(None).otherwise((num / den * 100).round(4))
+
+def write_db_partitions(data, db_path) -> None:
+    """!Appends rows to the global Parquet DB, one partition directory per BatchID.
+
+    Only the partitions present in `data` are written, so appending a batch costs
+    O(new rows) instead of rewriting the full history. Rows are sorted by
+    (Method, Timestamp) to mirror the ClickHouse ORDER BY key, keeping row-group
+    min/max statistics tight enough for readers to skip groups on Method filters.
+    Multi-batch tables (e.g. the sample restore) are grouped by BatchID first so
+    each partition is written contiguously, and the partition limit is raised to
+    the number of BatchIDs present. A legacy single-file DB at `db_path` is
+    converted first (see `migrate_single_file_db`).
+
+    @param data A pyarrow Table containing a BatchID column.
+    @param db_path Root directory of the partitioned Parquet DB.
     """
+    migrate_single_file_db(db_path)
+    num_batches = pc.count_distinct(data.column("BatchID")).as_py()
+
+    ds.write_dataset(
+        data.sort_by([("BatchID", "ascending"), *DB_SORT_KEYS]),
+        base_dir=str(db_path),
+        format="parquet",
+        partitioning=DB_PARTITIONING,
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=ds.ParquetFileFormat().make_write_options(
+            compression="zstd",
+            compression_level=3,
+            use_dictionary=True,
+            data_page_size=1_048_576,
+            write_statistics=True,
+        ),
+        max_rows_per_group=DB_ROW_GROUP_SIZE,
+        max_partitions=max(DB_MAX_PARTITIONS, num_batches),
+        use_threads=True,
+    )
+
+def migrate_single_file_db(db_path) -> None:
+    """!Converts a legacy single-file Parquet DB (e.g. `db/db.parquet`) into the partitioned layout.
+
+    Older installs stored the whole history in one file at DB_PATH. The file is
+    cast to SCHEMA, moved aside to `<name>.legacy`, and rewritten as BatchID
+    partitions under the same path, so existing `.env` files keep working.
+    Does nothing if `db_path` is not a regular file.
+
+    @param db_path Configured DB path.
+
+    @throws FileExistsError If a previous `<name>.legacy` file is in the way.
+    @throws ValueError If the legacy file is missing SCHEMA columns.
+    """
+    db_path = Path(db_path)
+    if not db_path.is_file():
+        return
+
+    legacy_path = db_path.with_name(f"{db_path.name}.legacy")
+    if legacy_path.exists():
+        raise FileExistsError(f"Cannot migrate {db_path}: {legacy_path} already exists")
+
+    print(f"[INFO] Converting single-file Parquet DB {db_path} to BatchID partitions (original kept at {legacy_path})")
+    table = safe_vector_cast(pl.read_parquet(db_path), SCHEMA).select(list(SCHEMA)).to_arrow()
+    db_path.rename(legacy_path)
+
     try:
-        if "NA" in (numerator, denominator):
-            return "NA"
-        
-        num = float(numerator)
-        denom = float(denominator)
+        write_db_partitions(table, db_path)
+    except Exception:
+        shutil.rmtree(db_path, ignore_errors=True)
+        legacy_path.rename(db_path)
+        raise
 
-        return round(num / denom, 4)
-    except:
-        return "NA"
+def open_db_dataset(db_path, batch_id: str | None = None) -> ds.Dataset:
+    """!Opens the global Parquet DB (or a single Parquet file) as a pyarrow dataset.
 
-def safe_div_percent(numerator, denominator):
-    """!Computes percentage-based division safely, with 'NA' fallback.
+    The full SCHEMA_ARROW is imposed on the dataset, so columns absent from a
+    file (e.g. in files written before a column existed) are returned as nulls.
+    Passing `batch_id` opens that partition directory directly, so the rest of
+    the history is never listed.
 
-    Similar to safe_div, but multiplies the result by 100 to express it as a percent.
-    Invalid input or "NA" strings will return "NA" as a string.
+    @param db_path Root directory of the partitioned Parquet DB, or a plain Parquet file.
+    @param batch_id Optional BatchID whose partition should be opened on its own.
 
-    @param numerator Numerator of the division (can be int, float, or "NA").
-    @param denominator Denominator of the division (can be int, float, or "NA").
+    @return A pyarrow Dataset; stream it with `to_batches(columns=list(SCHEMA), ...)`.
 
-    @return Percentage value (rounded to 4 decimals), or "NA" if invalid.
+    @throws FileNotFoundError If `batch_id` is given and its partition does not exist.
     """
-    try:
-        if "NA" in (numerator, denominator):
-            return "NA"
-        
-        num = float(numerator)
-        denom = float(denominator)
-
-        return round((num / denom) * 100, 4)
-    except:
-        return "NA"
+    if batch_id is None:
+        return ds.dataset(str(db_path), schema=SCHEMA_ARROW, format="parquet", partitioning=DB_PARTITIONING)
+
+    return ds.dataset(
+        str(Path(db_path) / f"BatchID={batch_id}"),
+        schema=SCHEMA_ARROW,
+        format="parquet",
+        partitioning=DB_PARTITIONING,
+        partition_base_dir=str(db_path),
+    )
+
+def scan_db(db_path, batch_id: str | None = None) -> pl.LazyFrame:
+    """!Lazily scans the global Parquet DB (or a single Parquet file) in SCHEMA column order.
+
+    Filters on BatchID are pushed down into the pyarrow dataset, so only the
+    matching partition directories are read.
+
+    @param db_path Root directory of the partitioned Parquet DB, or a plain Parquet file.
+    @param batch_id Optional BatchID whose partition should be scanned on its own.
+
+    @return A Polars LazyFrame over the dataset.
+
+    @throws FileNotFoundError If `batch_id` is given and its partition does not exist.
+    """
+    return pl.scan_pyarrow_dataset(open_db_dataset(db_path, batch_id)).select(list(SCHEMA))
@@ -0,0 +1,92 @@
+# ===========================================
+# worker.py
+# ===========================================
+
+## \file worker.py
+## \brief Long-lived pipeline worker that amortizes polars/pyarrow imports across a batch.
+##
+## \details
+## \par Description
+##     Every pipeline script used to run as its own Python process, re-importing
+##     polars/pyarrow and re-initializing their thread pools once per method.
+##     This worker imports them once and then executes line-delimited JSON
+##     commands read from stdin, dispatching to the same functions the
+##     standalone scripts expose.
+##
+## \par Protocol
+##     One JSON object per line on stdin, one JSON reply per line on stdout:
+## \code
+## {"cmd": "gen_perf", "args": {"batch_dir": ..., "log_path": ..., "trials": ..., ...}}
+## {"cmd": "combine", "batch_dir": ..., "output_path": ...}
+## {"cmd": "insert", "batchid": ...}
+## \endcode
+##     Replies are `{"ok": true}` or `{"ok": false, "error": "<message>"}`.
+##     Log output from the commands is redirected to stderr so stdout only
+##     carries replies.
+##
+## \par Usage
+## \code
+## coproc WORKER { python3 pipeline/worker.py; }
+## \endcode
+##
+## \par Notes
+##     - `scripts/run_perf.sh` starts one worker per batch via `coproc`
+##     - Each pipeline script keeps its `__main__` entrypoint as a standalone fallback
+##     - ClickHouse dependencies are only imported on the first `insert` command
+
+
+from pipeline.combine_batch_parquets import combine_batch
+from pipeline.gen_perf_parquet_logs import load_payload, append_row
+from contextlib import redirect_stdout
+import json
+import sys
+
+
+def insert(batchid: str) -> None:
+    """!Inserts a batch into ClickHouse, importing the driver lazily.
+
+    @param batchid The BatchID to ingest.
+    """
+    from pipeline.insert_to_clickhouse import insert_batch
+    insert_batch(batchid)
+
+COMMANDS = {
+    "gen_perf": lambda cmd: append_row(load_payload(cmd["args"])),
+    "combine": lambda cmd: combine_batch(cmd["batch_dir"], cmd["output_path"]),
+    "insert": lambda cmd: insert(cmd["batchid"]),
+}
+
+
+def handle(line: str) -> dict:
+    """!Executes a single JSON command line.
+
+    @param line Raw JSON command.
+
+    @return Reply dict with `ok` and, on failure, `error`.
+    """
+    try:
+        cmd = json.loads(line)
+        handler = COMMANDS.get(cmd.get("cmd"))
+        if handler is None:
+            raise ValueError(f"Unknown command: {cmd.get('cmd')}")
+
+        with redirect_stdout(sys.stderr):
+            handler(cmd)
+        return {"ok": True}
+
+    except Exception as e:
+        print(f"[ERROR] Worker command failed: {e}", file=sys.stderr)
+        return {"ok": False, "error": str(e)}
+
+
+def main():
+    """!Reads commands from stdin until EOF, replying to each on stdout.
+    """
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        print(json.dumps(handle(line)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
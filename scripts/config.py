@@ -16,7 +16,9 @@
 ##     fallback defaults and central management of required keys.
 ## 
 ## \par Usage
-##     from scripts.config import CLICKHOUSE_HOST, DB_PATH, ...
+##     cfg = get_config()
+##     cfg.CLICKHOUSE_HOST, cfg.DB_PATH, ...
+##     `from scripts.config import DB_PATH, ...` still works and resolves lazily.
 ##     Parquet writers/readers will use `DB_PATH` and `SAMPLE_PATH`.
 ##     CLI runners and ingestion tools will use ClickHouse config values.
 ## 
@@ -24,15 +26,19 @@
 ##     - Loads from `.env` file in the project root (via `python-dotenv`)
 ##     - All paths are converted into `Path()` objects for consistency
 ##     - Ports are cast to `int` to prevent runtime casting bugs
+##     - `.env` is parsed on the first `get_config()` call, not at import
+##     - With `DB_PATH` unset, an existing legacy `db/db.parquet` is kept as the DB
+##       rather than silently switching to an empty `db/db_parquet`
 
 
 from dotenv import load_dotenv
+from functools import cache
 from pathlib import Path
+from typing import NamedTuple
 import os
+import sys
 
 
-load_dotenv()
-
 def env(key, default=None):
     """!Retrieve an environment variable with an optional default.
 
@@ -43,15 +49,94 @@ def env(key, default=None):
     """
     return os.getenv(key, default)
 
-CLICKHOUSE_HOST = env("CLICKHOUSE_HOST", "localhost")
-CLICKHOUSE_TCP_PORT = int(env("CLICKHOUSE_TCP_PORT", 9000))
-CLICKHOUSE_HTTP_PORT = int(env("CLICKHOUSE_HTTP_PORT", 8123))
-CLICKHOUSE_USER = env("CLICKHOUSE_USER", "default")
-CLICKHOUSE_PASSWORD = env("CLICKHOUSE_PASSWORD", "")
-CLICKHOUSE_HOST_DOCKER = env("CLICKHOUSE_HOST_DOCKER", "clickhouse")
-CLICKHOUSE_TCP_PORT_DOCKER = int(env("CLICKHOUSE_TCP_PORT_DOCKER", 9000))
-CLICKHOUSE_HTTP_PORT_DOCKER = int(env("CLICKHOUSE_HTTP_PORT_DOCKER", 8123))
-load_dotenv()
-
-DB_PATH = Path(env("DB_PATH", "db/db.parquet"))
-SAMPLE_PATH = Path(env("SAMPLE_PATH", "samples/db_sample.parquet"))
\ No newline at end of file
+
+"""!Default location of the BatchID-partitioned Parquet DB."""
+DEFAULT_DB_PATH = Path("db/db_parquet")
+
+"""!Pre-partitioning default DB location (a single Parquet file, converted in place on first write)."""
+LEGACY_DB_PATH = Path("db/db.parquet")
+
+
+def resolve_db_path() -> Path:
+    """!Resolves DB_PATH, keeping installs that relied on the old `db/db.parquet` default.
+
+    An explicit `DB_PATH` always wins. When it is unset and only the legacy DB
+    exists, the legacy path is used so its history is kept (and migrated in place
+    by `pipeline.utils.migrate_single_file_db`) instead of starting an empty dataset.
+
+    @return Path of the Parquet DB.
+
+    @throws RuntimeError If DB_PATH is unset and both the legacy and the new default DB exist.
+    """
+    configured = env("DB_PATH")
+    if configured is not None:
+        return Path(configured)
+
+    if not LEGACY_DB_PATH.exists():
+        return DEFAULT_DB_PATH
+
+    if DEFAULT_DB_PATH.exists():
+        raise RuntimeError(
+            f"DB_PATH is not set and both {LEGACY_DB_PATH} and {DEFAULT_DB_PATH} exist; "
+            f"set DB_PATH in .env to the one holding your history"
+        )
+
+    # stderr: stdout is the reply channel when running under pipeline/worker.py
+    print(f"[INFO] DB_PATH is not set; using existing DB at {LEGACY_DB_PATH}. Set DB_PATH in .env to silence this.", file=sys.stderr)
+    return LEGACY_DB_PATH
+
+
+class Config(NamedTuple):
+    """!Resolved pipeline and ClickHouse settings."""
+    CLICKHOUSE_HOST: str
+    CLICKHOUSE_TCP_PORT: int
+    CLICKHOUSE_HTTP_PORT: int
+    CLICKHOUSE_USER: str
+    CLICKHOUSE_PASSWORD: str
+    CLICKHOUSE_HOST_DOCKER: str
+    CLICKHOUSE_TCP_PORT_DOCKER: int
+    CLICKHOUSE_HTTP_PORT_DOCKER: int
+    DB_PATH: Path
+    SAMPLE_PATH: Path
+
+
+__all__ = ["env", "get_config", "Config", *Config._fields]
+
+
+@cache
+def get_config() -> Config:
+    """!Loads `.env` and resolves all settings, once per process.
+
+    Nothing is read from disk or cast at import time; the first call pays for
+    the `.env` parse and every later call returns the same tuple.
+
+    @return The resolved Config.
+    """
+    load_dotenv()
+
+    return Config(
+        CLICKHOUSE_HOST=env("CLICKHOUSE_HOST", "localhost"),
+        CLICKHOUSE_TCP_PORT=int(env("CLICKHOUSE_TCP_PORT", 9000)),
+        CLICKHOUSE_HTTP_PORT=int(env("CLICKHOUSE_HTTP_PORT", 8123)),
+        CLICKHOUSE_USER=env("CLICKHOUSE_USER", "default"),
+        CLICKHOUSE_PASSWORD=env("CLICKHOUSE_PASSWORD", ""),
+        CLICKHOUSE_HOST_DOCKER=env("CLICKHOUSE_HOST_DOCKER", "clickhouse"),
+        CLICKHOUSE_TCP_PORT_DOCKER=int(env("CLICKHOUSE_TCP_PORT_DOCKER", 9000)),
+        CLICKHOUSE_HTTP_PORT_DOCKER=int(env("CLICKHOUSE_HTTP_PORT_DOCKER", 8123)),
+        DB_PATH=resolve_db_path(),
+        SAMPLE_PATH=Path(env("SAMPLE_PATH", "samples/db_sample.parquet")),
+    )
+
+
+def __getattr__(name):
+    """!Resolves legacy module constants (e.g. `DB_PATH`) lazily through get_config().
+
+    @param name The attribute being looked up.
+
+    @return The matching Config field.
+
+    @throws AttributeError If the name is not a config field.
+    """
+    if name in Config._fields:
+        return getattr(get_config(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
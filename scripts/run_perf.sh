@@ -75,8 +75,8 @@
 ##   db/logs/batch_<BATCHID>/perf_<METHOD>_<TIMESTAMP>.csv
 ##     → Raw perf stat output
 ##
-##   db/logs/batch_<BATCHID>/perf_results_<METHOD>_<TIMESTAMP>_<BATCHID>.parquet
-##     → Parsed structured metrics for that method
+##   db/logs/batch_<BATCHID>/rows.jsonl
+##     → Parsed structured metrics, one line per method (removed once the batch is combined)
 ##
 ##   db/logs/batch_<BATCHID>/perf_results_all_<BATCHID>.parquet
 ##     → Combined metrics across all methods (for analysis or dashboarding)
@@ -140,13 +140,28 @@ PERF_EVENTS+="dTLB-loads,dTLB-load-misses"
 echo "[INFO] Using perf events:"
 echo "$PERF_EVENTS" | tr ',' '\n' | sed 's/^/  - /'
 
+# -------- Pipeline Worker --------
+# One resident Python process per batch: polars/pyarrow are imported once
+# and each step is sent as a JSON command (see pipeline/worker.py).
+coproc WORKER { python3 pipeline/worker.py; }
+
+worker_call() {
+    local reply
+    echo "$1" >&"${WORKER[1]}"
+    read -r reply <&"${WORKER[0]}"
+
+    if [[ "$reply" != '{"ok": true}' ]]; then
+        echo "[ERROR] Pipeline worker failed: $reply"
+        exit 1
+    fi
+}
+
 # -------- Run Each Method --------
 for METHOD in "${METHODS[@]}"; do
     METHOD_TIMESTAMP=$(date +"%Y-%m-%d %H:%M:%S")
     echo "[▶] Running: $METHOD"
 
     LOG_PATH="$LOG_DIR/perf_${METHOD}_${METHOD_TIMESTAMP}.csv"
-    PERF_PARQUET="$LOG_DIR/perf_results_${METHOD}_${METHOD_TIMESTAMP}_${BATCHID}.parquet"
 
     mkdir -p "$(dirname "$LOG_PATH")"
 
@@ -157,48 +172,26 @@ for METHOD in "${METHODS[@]}"; do
     WALL_NS=$((END - START_NS))
     WALL_S=$(awk "BEGIN {printf \"%.6f\", $WALL_NS / 1000000000}")
 
-    # Pull metrics into shell vars
-    eval "$(python3 pipeline/parse_perf_metrics.py "$LOG_PATH" "$TRIALS")"
-
-    python3 pipeline/gen_perf_parquet_logs.py \
-        --out_path "$PERF_PARQUET" \
-        --wall_time_s "$WALL_S" \
-        --wall_time_ns "$WALL_NS" \
-        --timestamp "$METHOD_TIMESTAMP" \
-        --batchid "$BATCHID" \
-        --method "$METHOD" \
-        --trials "$TRIALS" \
-        --cycles "$CYCLES" \
-        --instr "$INSTR" \
-        --ipc "$IPC" \
-        --cache_loads "$CACHE_LOADS" \
-        --cache_miss "$CACHE_MISS" \
-        --l1_loads "$L1_LOADS" \
-        --l1_misses "$L1_MISSES" \
-        --l2_loads "$L2_LOADS" \
-        --l2_misses "$L2_MISSES" \
-        --l3_loads "$L3_LOADS" \
-        --l3_misses "$L3_MISSES" \
-        --tlb_loads "$TLB_LOADS" \
-        --tlb_misses "$TLB_MISSES" \
-        --branch_instr "$BRANCH_INSTR" \
-        --branch_misses "$BRANCH_MISSES" \
-        --miss_per_trial "$MISS_PER_TRIAL" \
-        --cycles_per_trial "$CYCLES_PER_TRIAL"
+    # Parse perf CSV + append the method's row inside the worker
+    worker_call "$(printf '{"cmd": "gen_perf", "args": {"batch_dir": "%s", "log_path": "%s", "trials": "%s", "wall_time_s": "%s", "wall_time_ns": "%s", "timestamp": "%s", "batchid": "%s", "method": "%s"}}' \
+        "$LOG_DIR" "$LOG_PATH" "$TRIALS" "$WALL_S" "$WALL_NS" "$METHOD_TIMESTAMP" "$BATCHID" "$METHOD")"
 done
 
-python3 pipeline/combine_batch_parquets.py \
-  "$LOG_DIR" \
-  "$LOG_DIR/perf_results_all_${BATCHID}.parquet"
+worker_call "$(printf '{"cmd": "combine", "batch_dir": "%s", "output_path": "%s"}' \
+    "$LOG_DIR" "$LOG_DIR/perf_results_all_${BATCHID}.parquet")"
 
 if [ "$INSERT_DB" = true ]; then
-    python3 pipeline/insert_to_clickhouse.py \
-    --batchid "$BATCHID"
+    worker_call "$(printf '{"cmd": "insert", "batchid": "%s"}' "$BATCHID")"
 else
   echo "[INFO] Skipping ClickHouse insertion (insert_db=false)"
 fi
 
+# Close the worker's stdin so it exits, then reap it
+WORKER_PID_SAVED=$WORKER_PID
+eval "exec ${WORKER[1]}>&-"
+wait "$WORKER_PID_SAVED"
+
 echo "[INFO] Simulation Finished:"
-echo "     └─ Exported CSV & Parquet logs to  : $LOG_DIR"
+echo "     └─ Exported CSV logs to  : $LOG_DIR"
 echo "     └─ Combined batch Parquet logs  : $LOG_DIR/perf_results_all_${BATCHID}.parquet"
 
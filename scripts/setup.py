@@ -13,7 +13,7 @@
 ## - Creates database and table schema using `schema_to_clickhouse.py`
 ## - Loads benchmarking data from either:
 ##   - A sample Parquet file (`samples/db_sample.parquet`)
-##   - A user-generated Parquet log (`db/db.parquet`)
+##   - A user-generated partitioned Parquet DB (`db/db_parquet`)
 ##
 ## \par Usage
 ## \code
@@ -23,30 +23,48 @@
 ## \par Options
 ## - `--docker-compose` — Start ClickHouse and Grafana with Docker Compose  
 ## - `--setup-clickhouse` — Explicitly create the ClickHouse database and performance table  
-## - `--load-from-sample` — Load data from `samples/db_sample.parquet` (overwrites DB)  
-## - `--load-from-db` — Load data from existing `db/db.parquet` file  
+## - `--load-from-sample` — Load data directly from `samples/db_sample.parquet` (overwrites DB)  
+## - `--load-from-db` — Load data from existing `db/db_parquet` dataset  
 ##
 ## \par Notes
 ## - Configuration is loaded from `.env` via `scripts/config.py`
 ## - ClickHouse and Grafana must be available via Docker if `--docker-compose` is used
-## - Requires `clickhouse-driver`, `polars`, and Docker CLI to be installed
+## - Requires `clickhouse-driver` (with the `lz4` and `numpy` extras), `polars`, and Docker CLI to be installed
+## - The native client compresses blocks with LZ4 on the wire
+## - "NA" handling is done in Polars by `safe_vector_cast`, and inserts are columnar
+##   numpy arrays with no per-row dict conversion. The driver's `use_numpy` mode pulls in
+##   pandas (via the `numpy` extra) and uses it internally for null/datetime handling
 
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import subprocess
 import os
 import shutil
 import time
 from pathlib import Path
 from clickhouse_driver import Client
+from clickhouse_driver.errors import Error
+import numpy as np
 import polars as pl
 
 from pipeline.schema_to_clickhouse import generate_clickhouse_table
 from pipeline.schema import SCHEMA
-from pipeline.utils import safe_vector_cast
+from pipeline.utils import DB_STREAM_BATCH_ROWS, open_db_dataset, safe_vector_cast, scan_db, write_db_partitions
 from scripts.config import *
 
 
+## ORDER BY key of benchmark.performance (see `generate_clickhouse_table`).
+CLICKHOUSE_ORDER_BY = ["Method", "Timestamp"]
+
+## Total time `wait_for_clickhouse` keeps retrying before giving up.
+CLICKHOUSE_WAIT_TIMEOUT_S = 60
+
+## Native-protocol client settings; larger insert blocks mean fewer round trips per load,
+## and `use_numpy` lets numeric columns be sent straight from their numpy buffers.
+CLICKHOUSE_CLIENT_SETTINGS = {"insert_block_size": 1_048_576, "use_numpy": True}
+
+
 def log(msg: str):
     """!Prints an info message to stdout.
 
@@ -70,25 +88,49 @@ def run_command(cmd: str):
     subprocess.run(cmd, shell=True, check=True)
 
 def wait_for_clickhouse() -> Client:
-    """!Waits for ClickHouse server to become ready, retries for up to 30 attempts.
+    """!Waits for ClickHouse server to become ready, retrying for up to CLICKHOUSE_WAIT_TIMEOUT_S seconds.
+
+    A single Client is built up front and only the `SELECT 1` probe is retried,
+    with exponential backoff capped at 10 seconds (and at the time left). The same client (with TCP
+    keepalive enabled) is returned for all later setup and load calls.
+
     @return A connected ClickHouse Client instance.
-    @throws RuntimeError if ClickHouse doesn't respond after all attempts.
+    @throws RuntimeError if ClickHouse doesn't respond before the deadline.
     """
     log("Waiting for ClickHouse...")
+    log(f"Connecting to ClickHouse at {CLICKHOUSE_HOST}:{CLICKHOUSE_TCP_PORT} as user '{CLICKHOUSE_USER}'")
+
+    client = Client(
+        host=CLICKHOUSE_HOST,
+        port=CLICKHOUSE_TCP_PORT,
+        user=CLICKHOUSE_USER,
+        password=CLICKHOUSE_PASSWORD,
+        compression="lz4",
+        connect_timeout=1,
+        send_receive_timeout=300,
+        tcp_keepalive=True,
+        settings=CLICKHOUSE_CLIENT_SETTINGS
+    )
+
+    deadline = time.monotonic() + CLICKHOUSE_WAIT_TIMEOUT_S
+    attempt = 0
 
-    for attempt in range(30):
+    while True:
+        attempt += 1
         try:
-            log(f"Connecting to ClickHouse at {CLICKHOUSE_HOST}:{CLICKHOUSE_TCP_PORT} as user '{CLICKHOUSE_USER}'")
-            client = Client(host=CLICKHOUSE_HOST, port=CLICKHOUSE_TCP_PORT, user=CLICKHOUSE_USER, password=CLICKHOUSE_PASSWORD)
             client.execute("SELECT 1")
             log("ClickHouse is ready.")
             return client
-        
-        except Exception as e:
-            log(f"Attempt {attempt+1}/30 failed: {e}")
-            time.sleep(2)
 
-    raise RuntimeError("ClickHouse did not start after 30 attempts.")
+        # Error covers NetworkError and SocketTimeoutError (a slow connect under connect_timeout=1)
+        except (Error, EOFError) as e:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            log(f"Attempt {attempt} failed: {e}")
+            time.sleep(min(2 ** (attempt - 1), 10, remaining))
+
+    raise RuntimeError(f"ClickHouse did not start within {CLICKHOUSE_WAIT_TIMEOUT_S} seconds ({attempt} attempts).")
 
 def setup_clickhouse(client: Client):
     """!Creates the ClickHouse database and performance table if they don't exist.
@@ -99,14 +141,35 @@ def setup_clickhouse(client: Client):
     client.execute(generate_clickhouse_table())
     log("Schema loaded into ClickHouse.")
 
+def to_numpy_column(series: pl.Series) -> np.ndarray:
+    """!Converts a column into the ndarray form clickhouse-driver accepts with `use_numpy`.
+
+    Null-free numeric/datetime columns are exported straight from their buffers.
+    Strings and any column containing nulls become object arrays holding `None`
+    for nulls: the driver only treats `None` as NULL, while `to_numpy()` would
+    turn nulls into NaN.
+
+    @param series The Polars Series to convert.
+
+    @return A numpy array suitable for a columnar INSERT.
+    """
+    if series.null_count() or not (series.dtype.is_numeric() or series.dtype.is_temporal()):
+        return np.array(series.to_list(), dtype=object)
+    return series.to_numpy()
+
 def load_db_to_clickhouse(client: Client, db_path: Path):
-    """!Wipes previous data and loads data from a Parquet file into ClickHouse.
+    """!Wipes previous data and loads data from a Parquet file or partitioned DB into ClickHouse.
 
-    Casts data using the shared schema and inserts it into the benchmark.performance table.
+    Streams the dataset in Arrow record batches of DB_STREAM_BATCH_ROWS rows; each
+    batch is cast using the shared schema and inserted into the benchmark.performance
+    table as columnar ndarrays (see `to_numpy_column`), so no per-row dicts are
+    built, null-free numeric columns are not boxed, and
+    peak memory stays at one batch. Each batch is sorted on the
+    table's ORDER BY key so ClickHouse does not have to re-sort inserted blocks.
     Existing table data will be truncated.
 
     @param client The connected ClickHouse client.
-    @param db_path Path to the Parquet file to load.
+    @param db_path Path to the Parquet file or partitioned DB directory to load.
     @throws FileNotFoundError if the file does not exist.
     @throws Exception if insertion fails.
     """
@@ -114,29 +177,56 @@ def load_db_to_clickhouse(client: Client, db_path: Path):
         raise FileNotFoundError(f"{db_path} not found")
 
     log(f"Loading data from: {db_path}")
-    df = pl.read_parquet(db_path)
-    df = safe_vector_cast(df, SCHEMA)
+    dataset = open_db_dataset(db_path)
+
+    # Column order must match the explicit column list in the INSERT statement
+    columns = ", ".join(f"`{c}`" for c in SCHEMA)
+    inserted = 0
 
-    records = df.to_dicts()
-    
-    if not records:
-        log("No records to insert.")
-        return
-    
     try:
         client.execute("TRUNCATE TABLE benchmark.performance")
-        client.execute("INSERT INTO benchmark.performance VALUES", records)
+
+        for batch in dataset.to_batches(columns=list(SCHEMA), batch_size=DB_STREAM_BATCH_ROWS):
+            df = safe_vector_cast(pl.from_arrow(batch), SCHEMA)
+
+            # Pre-sort by the table's ORDER BY key so ClickHouse does not re-sort the block
+            df = df.sort(CLICKHOUSE_ORDER_BY)
+            data = [to_numpy_column(df[c]) for c in SCHEMA]
+            client.execute(f"INSERT INTO benchmark.performance ({columns}) VALUES", data, columnar=True)
+            inserted += df.height
     except Exception as e:
         err(f"Error inserting records into ClickHouse: {e}")
         raise
+
+    if not inserted:
+        log("No records to insert.")
+    else:
+        log(f"Inserted {inserted} records into ClickHouse.")
     
 
+def restore_db_from_sample(sample_path: Path, db_path: Path):
+    """!Replaces the local Parquet DB with the sample data.
+
+    Any existing DB (partitioned directory or legacy single file) is removed
+    first, so sample batches are never merged into the user's own history.
+
+    @param sample_path Path to the sample Parquet file.
+    @param db_path Path of the partitioned DB to replace.
+    """
+    if db_path.is_dir():
+        shutil.rmtree(db_path)
+    elif db_path.exists():
+        db_path.unlink()
+
+    write_db_partitions(scan_db(sample_path).collect().to_arrow(), db_path)
+    log(f"Local DB at {db_path} replaced with sample data.")
+
 def main():
     """!CLI entrypoint. Parses arguments and coordinates Docker, schema setup, and data loading.
     """
     parser = argparse.ArgumentParser(description="Setup and load benchmark data into ClickHouse")
     parser.add_argument("--load-from-sample", action="store_true", help="Setup and restore from db_sample.parquet")
-    parser.add_argument("--load-from-db", action="store_true", help="Setup and use existing db.parquet")
+    parser.add_argument("--load-from-db", action="store_true", help="Setup and use existing db_parquet dataset")
     parser.add_argument("--docker-compose", action="store_true", help="Use Docker Compose to start ClickHouse & Grafana")
     parser.add_argument("--setup-clickhouse", action="store_true", help="Setup ClickHouse database and table")
 
@@ -164,8 +254,12 @@ def main():
         
     if args.load_from_sample:
         log(f"Loading from sample data: {SAMPLE_PATH}")
-        shutil.copy(SAMPLE_PATH, DB_PATH)
-        load_db_to_clickhouse(client, DB_PATH)
+
+        # Replace the local DB with the sample on a worker thread; it overlaps with the network-bound insert
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            snapshot = pool.submit(restore_db_from_sample, SAMPLE_PATH, DB_PATH)
+            load_db_to_clickhouse(client, SAMPLE_PATH)
+            snapshot.result()
 
     elif args.load_from_db:
         log(f"Loading from existing data: {DB_PATH}")